@@ -1,3 +1,5 @@
+from typing import Dict, List, Optional, Tuple
+
 import libcst as cst
 import networkx as nx
 
@@ -12,28 +14,22 @@ def compile_graph(graph: GraphicalModel, namespace: dict, fn_name):
     #  1. (samplers only) rng_key;
     #  2. (logpdf only) random variables, in the order in which they appear in the model.
     #  3. (all) the model's arguments and keyword arguments.
-    maybe_rng_key = [
-        compile_placeholder(node, graph)
-        for node in graph.placeholders
-        if node.name == "rng_key"
-    ]
-    maybe_random_variables = [
-        compile_placeholder(node, graph)
-        for node in reversed(list(graph.placeholders))
-        if node.is_random_variable
-    ]
-    model_args = [
-        compile_placeholder(node, graph)
-        for node in graph.placeholders
-        if not node.is_random_variable
-        and node.name != "rng_key"
-        and not node.has_default
-    ]
-    model_kwargs = [
-        compile_placeholder(node, graph)
-        for node in graph.placeholders
-        if not node.is_random_variable and node.name != "rng_key" and node.has_default
-    ]
+    maybe_rng_key = []
+    maybe_random_variables = []
+    model_args = []
+    model_kwargs = []
+    for node in graph.placeholders:
+        compiled = compile_placeholder(node, graph)
+        if node.name == "rng_key":
+            maybe_rng_key.append(compiled)
+        elif node.is_random_variable:
+            maybe_random_variables.append(compiled)
+        elif node.has_default:
+            model_kwargs.append(compiled)
+        else:
+            model_args.append(compiled)
+    maybe_random_variables.reverse()
+
     args = maybe_rng_key + model_args + maybe_random_variables + model_kwargs
 
     # Every statement in the function corresponds to either a constant definition or
@@ -41,77 +37,108 @@ def compile_graph(graph: GraphicalModel, namespace: dict, fn_name):
     # dependency order.
     stmts = []
     returns = []
-    for node in nx.topological_sort(graph):
+    memo: Dict[int, cst.BaseExpression] = {}
+    # Unnamed nodes are inlined in the expressions of their successors and
+    # never appear as statements; we filter them out before the loop.
+    named_nodes = [node for node in nx.topological_sort(graph) if node.name is not None]
+    for node in named_nodes:
+        name = cst.Name(value=node.name)
 
-        if node.name is None:
+        if isinstance(node, Constant):
+            value = node.cst_generator()
+        elif isinstance(node, Op):
+            value = compile_op(node, graph, memo)
+        else:
             continue
 
-        if isinstance(node, Constant):
-            stmt = cst.SimpleStatementLine(
-                body=[
-                    cst.Assign(
-                        targets=[cst.AssignTarget(target=cst.Name(value=node.name))],
-                        value=node.cst_generator(),
-                    )
-                ]
-            )
-            stmts.append(stmt)
-
-        if isinstance(node, Op):
-            stmt = cst.SimpleStatementLine(
-                body=[
-                    cst.Assign(
-                        targets=[cst.AssignTarget(target=cst.Name(value=node.name))],
-                        value=compile_op(node, graph),
-                    )
-                ]
-            )
-            stmts.append(stmt)
-
-            if node.is_returned:
-                returns.append(
-                    cst.SimpleStatementLine(
-                        body=[cst.Return(value=cst.Name(value=node.name))]
-                    )
+        stmt = cst.SimpleStatementLine(
+            body=[
+                cst.Assign(
+                    targets=[cst.AssignTarget(target=name)],
+                    value=value,
                 )
-
-    # Assemble the function's CST using the previously translated nodes.
-    ast_fn = cst.Module(
-        body=[
-            cst.FunctionDef(
-                name=cst.Name(value=fn_name),
-                params=cst.Parameters(params=args),
-                body=cst.IndentedBlock(body=stmts + returns),
-            )
-        ]
+            ]
+        )
+        stmts.append(stmt)
+
+        if isinstance(node, Op) and node.is_returned:
+            returns.append(cst.SimpleStatementLine(body=[cst.Return(value=name)]))
+
+    # Assemble the function's source code using the previously translated
+    # nodes. The function definition always has the same shape so we format
+    # it directly and only use LibCST to render the parameters and statements;
+    # this avoids rebuilding the whitespace of an `IndentedBlock`.
+    #
+    # LibCST cannot be compiled directly, so the source is then compiled. The
+    # code object is given the function's name so tracebacks point to the
+    # generated function.
+    module = cst.Module(body=[])
+    params_code = module.code_for_node(cst.Parameters(params=args))
+    body_code = [module.code_for_node(stmt).strip() for stmt in stmts + returns]
+    code = (
+        f"def {fn_name}({params_code}):\n    "
+        + "\n    ".join(body_code or ["pass"])
+        + "\n"
     )
-
-    code = ast_fn.code
-    exec(code, namespace)
+    exec(compile(code, f"<{fn_name}>", "exec"), namespace)
     fn = namespace[fn_name]
 
     return fn, code
 
 
-def compile_op(node: Op, graph: GraphicalModel):
-    """Compile an Op by recursively compiling and including its
-    upstream nodes.
+def compile_op(
+    node: Op,
+    graph: GraphicalModel,
+    memo: Optional[Dict[int, cst.BaseExpression]] = None,
+):
+    """Compile an Op by compiling and including its upstream nodes.
+
+    Unnamed nodes can be shared by several downstream Ops. Their CST is stored
+    in `memo`, keyed by node identity, so each subtree is only compiled once.
+    LibCST nodes are immutable and can safely be shared between parents.
+
+    The unnamed upstream nodes are traversed in post-order using an explicit
+    stack rather than recursion: a node is compiled once all its unnamed
+    predecessors are in `memo`.
     """
-    op_args = {}
-    op_kwargs = {}
-    for predecessor in graph.predecessors(node):
+    if memo is None:
+        memo = {}
+
+    stack = [node]
+    while stack:
+        current = stack[-1]
+        if id(current) in memo:
+            stack.pop()
+            continue
+
+        pending = [
+            predecessor
+            for predecessor, edge in graph.pred[current].items()
+            if edge["src_anon"] and id(predecessor) not in memo
+        ]
+        if pending:
+            stack.extend(pending)
+            continue
+
+        stack.pop()
+        memo[id(current)] = compile_node(current, graph, memo)
+
+    return memo[id(node)]
 
-        # I am not sure what this is about, consider deleting.
-        if graph[predecessor][node] == {}:
-            pass
+
+def compile_node(node, graph: GraphicalModel, memo: Dict[int, cst.BaseExpression]):
+    """Compile a node whose unnamed predecessors have already been compiled."""
+    arg_writes: List[Tuple[int, cst.BaseExpression]] = []
+    kwarg_writes: List[Tuple[str, cst.BaseExpression]] = []
+    for predecessor, edge in graph.pred[node].items():
 
         # If a predecessor has a name, it is either a random or
         # a deterministic variable. We only need to reference its
         # name here.
-        if predecessor.name is not None:
-            pred_ast = cst.Name(value=predecessor.name)
+        if edge["src_anon"]:
+            pred_ast = memo[id(predecessor)]
         else:
-            pred_ast = compile_op(predecessor, graph)
+            pred_ast = cst.Name(value=predecessor.name)
 
         # To rebuild the node's CST we need to pass the compiled
         # CST of the arguments as arguments to the generator function.
@@ -124,19 +151,21 @@ def compile_op(node: Op, graph: GraphicalModel):
         # bugs and should be corrected.
         # This also means we do not feed repeated arguments several times
         # when we should.
-        edge = graph[predecessor][node]
         if edge["type"] == "arg":
-            for idx in edge["position"]:
-                if idx in op_args:
-                    raise IndexError("Duplicate argument position")
-                op_args[idx] = pred_ast
+            arg_writes.extend((idx, pred_ast) for idx in edge["position"])
         else:
-            for key in graph[predecessor][node]["key"]:
-                op_kwargs[key] = pred_ast
-
-    args = [op_args[idx] for idx in sorted(op_args.keys())]
-
-    return node.cst_generator(*args, **op_kwargs)
+            kwarg_writes.extend((key, pred_ast) for key in edge["key"])
+
+    # Each position can only be filled by a single incoming edge so the
+    # op's arity is the total number of positions carried by its edges.
+    op_args: List[Optional[cst.BaseExpression]] = [None] * len(arg_writes)
+    for idx, pred_ast in arg_writes:
+        if op_args[idx] is not None:
+            raise IndexError("Duplicate argument position")
+        op_args[idx] = pred_ast
+    op_kwargs = dict(kwarg_writes)
+
+    return node.cst_generator(*op_args, **op_kwargs)
 
 
 def compile_placeholder(node: Placeholder, graph: GraphicalModel):
@@ -1,5 +1,5 @@
 """The McxST symbolic graph."""
-from typing import Tuple
+from typing import Dict, Tuple
 
 import networkx as nx
 
@@ -9,9 +9,79 @@ from mcx.core.nodes import Constant, Op, Placeholder, SampleOp
 class GraphicalModel(nx.DiGraph):
     """Intermediate representation of a probabilistic model in MCX."""
 
-    def __init__(self):
+    def __init__(self) -> None:
         super().__init__()
 
+        # Placeholders and random variables are queried repeatedly when
+        # transforming and compiling the graph. We index them by kind as nodes
+        # are added and removed so the corresponding properties do not need to
+        # scan the whole graph. Dictionaries are used as insertion-ordered sets.
+        self._by_kind: Dict[str, Dict] = {"placeholder": {}, "random_variable": {}}
+
+    # ----------------------------------------------------------------
+    #                 TRACK STRUCTURAL MODIFICATIONS
+    # ----------------------------------------------------------------
+
+    def _index_node(self, node) -> None:
+        if isinstance(node, Placeholder):
+            self._by_kind["placeholder"].setdefault(node, None)
+        elif isinstance(node, SampleOp):
+            self._by_kind["random_variable"].setdefault(node, None)
+
+    def _unindex_node(self, node) -> None:
+        for nodes in self._by_kind.values():
+            nodes.pop(node, None)
+
+    def _reindex(self) -> None:
+        """Rebuild the index after a bulk modification of the nodes."""
+        for nodes in self._by_kind.values():
+            nodes.clear()
+        for node in self._node:
+            self._index_node(node)
+
+    def add_node(self, node_for_adding, **attr):
+        super().add_node(node_for_adding, **attr)
+        self._index_node(node_for_adding)
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        super().add_nodes_from(nodes_for_adding, **attr)
+        self._reindex()
+
+    def remove_node(self, n):
+        super().remove_node(n)
+        self._unindex_node(n)
+
+    def remove_nodes_from(self, nodes):
+        super().remove_nodes_from(nodes)
+        self._reindex()
+
+    def _tag_edge(self, u, v) -> None:
+        """Record on the edge whether its source node is unnamed.
+
+        The compiler inlines the CST of unnamed predecessors and references
+        named ones by name. Nodes are only named before their outgoing edges
+        are added, so we compute this once here instead of at every compilation.
+
+        """
+        self._succ[u][v]["src_anon"] = u.name is None
+
+    def add_edge(self, u_of_edge, v_of_edge, **attr):
+        super().add_edge(u_of_edge, v_of_edge, **attr)
+        self._tag_edge(u_of_edge, v_of_edge)
+        self._index_node(u_of_edge)
+        self._index_node(v_of_edge)
+
+    def add_edges_from(self, ebunch_to_add, **attr):
+        ebunch_to_add = list(ebunch_to_add)
+        super().add_edges_from(ebunch_to_add, **attr)
+        for edge in ebunch_to_add:
+            self._tag_edge(edge[0], edge[1])
+        self._reindex()
+
+    def clear(self):
+        super().clear()
+        self._reindex()
+
     def add(self, node, *args, **kwargs) -> None:
         """Add a new node to the graph.
 
@@ -122,23 +192,22 @@ class GraphicalModel(nx.DiGraph):
 
     def find_node(self, name: str):
         """Find a random variable by its name."""
-        node = [node for node in self.random_variables if node.name == name]
-        if node:
-            return node[0]
+        return next((node for node in self.random_variables if node.name == name), None)
 
     @property
     def leaf(self):
-        leaves = [node for node in self.nodes() if self.out_degree(node) == 0]
-        if len(leaves) > 1:
+        leaves = (node for node in self.nodes() if self.out_degree(node) == 0)
+        leaf = next(leaves, None)
+        if leaf is None or next(leaves, None) is not None:
             raise SyntaxError
-        return leaves[0]
+        return leaf
 
     def has_default_value(self, placeholder: Placeholder):
         return self.in_degree(placeholder) == 0
 
     @property
     def placeholders(self):
-        return tuple([node for node in self.nodes() if isinstance(node, Placeholder)])
+        return tuple(self._by_kind["placeholder"])
 
     @property
     def args(self):
@@ -152,12 +221,13 @@ class GraphicalModel(nx.DiGraph):
 
     @property
     def returned_variables(self):
-        is_returned = lambda node: isinstance(node, Op) and node.is_returned
-        return tuple([node for node in self.nodes() if is_returned(node)])
+        return tuple(
+            node for node in self.nodes() if isinstance(node, Op) and node.is_returned
+        )
 
     @property
     def random_variables(self):
-        return tuple([node for node in self.nodes() if isinstance(node, SampleOp)])
+        return tuple(self._by_kind["random_variable"])
 
     @property
     def distributions(self):
@@ -420,7 +420,7 @@ class ModelDefinitionParser(cst.CSTVisitor):
             else:
                 raise SyntaxError(
                     "Expressions on the right-hand-side of <~ must be models or distributions. "
-                    f"Found the node {expression} instead."
+                    f"Found the expression `{cst.Module([]).code_for_node(expression)}` instead."
                 )
 
             fn_obj = eval(fn_call_path, self.namespace)
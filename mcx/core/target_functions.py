@@ -12,7 +12,7 @@ import libcst as cst
 
 from mcx.core.compiler import compile_graph
 from mcx.core.graph import GraphicalModel
-from mcx.core.nodes import Op, Placeholder, SampleModelOp, SampleOp
+from mcx.core.nodes import Op, Placeholder, SampleModelOp
 
 __all__ = [
     "logpdf",
@@ -53,7 +53,7 @@ def logpdf(model):
 
         return expr
 
-    logpdf_contribs = [node for node in graph if isinstance(node, SampleOp)]
+    logpdf_contribs = list(graph.random_variables)
     sum_node = Op(to_sum_of_logpdf, graph.name, "logpdf", is_returned=True)
     graph.add(sum_node, *logpdf_contribs)
 
@@ -79,7 +79,7 @@ def logpdf_contributions(model):
 
     # add a new node, a dictionary that contains the contribution of each
     # variable to the log-probability.
-    logpdf_contribs = [node for node in graph if isinstance(node, SampleOp)]
+    logpdf_contribs = list(graph.random_variables)
 
     scopes = set()
     scope_map = defaultdict(dict)
@@ -158,40 +158,7 @@ def _logpdf_core(graph: GraphicalModel):
     def placeholder_to_param(name: str):
         return cst.Param(cst.Name(name))
 
-    for node in graph.random_variables:
-        if not isinstance(node, SampleModelOp):
-            continue
-
-        rv_name = node.name
-        returned_var_name = node.graph.returned_variables[0].name
-
-        def sample_index(rv, returned_var, *_):
-            return cst.Subscript(
-                cst.Name(rv),
-                [cst.SubscriptElement(cst.SimpleString(f"'{returned_var}'"))],
-            )
-
-        chosen_sample = Op(
-            partial(sample_index, rv_name, returned_var_name),
-            graph.name,
-            f"{rv_name}_value",
-        )
-
-        original_edges = []
-        data = []
-        out_nodes = []
-        for e in graph.out_edges(node):
-            datum = graph.get_edge_data(*e)
-            data.append(datum)
-            original_edges.append(e)
-            out_nodes.append(e[1])
-
-        for e in original_edges:
-            graph.remove_edge(*e)
-
-        graph.add(chosen_sample, node)
-        for e, d in zip(out_nodes, data):
-            graph.add_edge(chosen_sample, e, **d)
+    select_returned_values(graph)
 
     # We need to loop through the nodes in reverse order because of the compilation
     # quirk which makes it that nodes added first to the graph appear first in the
@@ -243,14 +210,12 @@ def _logpdf_core(graph: GraphicalModel):
         #
         # We cannot remove edges while iterating over the graph, hence the two-step
         # process.
-        # to_remove = []
         successors = list(graph.successors(node))
         for s in successors:
             edge_data = graph.get_edge_data(node, s)
             graph.add_edge(placeholder, s, **edge_data)
 
-        for s in successors:
-            graph.remove_edge(node, s)
+        graph.remove_edges_from([(node, s) for s in successors])
 
     # The original MCX model may return one or many variables. None of
     # these variables should be returned, so we turn the `is_returned` flag
@@ -267,21 +232,25 @@ def _logpdf_core(graph: GraphicalModel):
 # --------------------------------------------------------
 
 
+def distribution_to_sampler(cst_generator, *args, **kwargs):
+    """Update a SampleOp to return a sample from its distribution.
+
+    `a <~ Normal(0, 1)` becomes `a = Normal(0, 1).sample(rng_key)`.
+
+    """
+    rng_key = kwargs.pop("rng_key")
+    return cst.Call(
+        func=cst.Attribute(cst_generator(*args, **kwargs), cst.Name("sample")),
+        args=[cst.Arg(value=rng_key)],
+    )
+
+
 def sample_predictive(model):
     """Sample from the model's predictive distribution."""
     graph = copy.deepcopy(model.graph)
 
     rng_node = Placeholder(lambda: cst.Param(cst.Name(value="rng_key")), "rng_key")
 
-    # Update the SampleOps to return a sample from the distribution so that
-    # `a <~ Normal(0, 1)` becomes `a = Normal(0, 1).sample(rng_key)`.
-    def distribution_to_sampler(cst_generator, *args, **kwargs):
-        rng_key = kwargs.pop("rng_key")
-        return cst.Call(
-            func=cst.Attribute(cst_generator(*args, **kwargs), cst.Name("sample")),
-            args=[cst.Arg(value=rng_key)],
-        )
-
     def model_to_sampler(model_name, *args, **kwargs):
         rng_key = kwargs.pop("rng_key")
         return cst.Call(
@@ -358,15 +327,6 @@ def sample_joint(model):
 
     rng_node = Placeholder(lambda: cst.Param(cst.Name(value="rng_key")), "rng_key")
 
-    # Update the SampleOps to return a sample from the distribution so that
-    # `a <~ Normal(0, 1)` becomes `a = Normal(0, 1).sample(rng_key)`.
-    def distribution_to_sampler(cst_generator, *args, **kwargs):
-        rng_key = kwargs.pop("rng_key")
-        return cst.Call(
-            func=cst.Attribute(cst_generator(*args, **kwargs), cst.Name("sample")),
-            args=[cst.Arg(value=rng_key)],
-        )
-
     def model_to_sampler(model_name, *args, **kwargs):
         rng_key = kwargs.pop("rng_key")
         return cst.Call(
@@ -387,40 +347,7 @@ def sample_joint(model):
     for var in random_variables:
         graph.add_edge(rng_node, var, type="kwargs", key=["rng_key"])
 
-    for node in graph.random_variables:
-        if not isinstance(node, SampleModelOp):
-            continue
-
-        rv_name = node.name
-        returned_var_name = node.graph.returned_variables[0].name
-
-        def sample_index(rv, returned_var, *_):
-            return cst.Subscript(
-                cst.Name(rv),
-                [cst.SubscriptElement(cst.SimpleString(f"'{returned_var}'"))],
-            )
-
-        chosen_sample = Op(
-            partial(sample_index, rv_name, returned_var_name),
-            graph.name,
-            rv_name + "_value",
-        )
-
-        original_edges = []
-        data = []
-        out_nodes = []
-        for e in graph.out_edges(node):
-            datum = graph.get_edge_data(*e)
-            data.append(datum)
-            original_edges.append(e)
-            out_nodes.append(e[1])
-
-        for e in original_edges:
-            graph.remove_edge(*e)
-
-        graph.add(chosen_sample, node)
-        for e, d in zip(out_nodes, data):
-            graph.add_edge(chosen_sample, e, **d)
+    select_returned_values(graph)
 
     tuple_node = Op(
         partial(to_dictionary_of_samples, graph.random_variables),
@@ -497,12 +424,7 @@ def sample_posterior_predictive(model, node_names):
 
     # Remove all edges incoming to the nodes that are targetted
     # by the intervention.
-    to_remove = []
-    for e in graph.in_edges(nodes):
-        to_remove.append(e)
-
-    for edge in to_remove:
-        graph.remove_edge(*edge)
+    graph.remove_edges_from(list(graph.in_edges(nodes)))
 
     # Each SampleOp that is intervened on is replaced by a placeholder that is indexed
     # by the index of the sample being taken.
@@ -523,14 +445,9 @@ def sample_posterior_predictive(model, node_names):
         chosen_sample = Op(sample_index, graph.name, rv_name + "_sample")
         graph.add(chosen_sample, placeholder, choice_node)
 
-        original_edges = []
-        for e in graph.out_edges(node):
-            data = graph.get_edge_data(*e)
-            original_edges.append(e)
-            graph.add_edge(chosen_sample, e[1], **data)
-
-        for e in original_edges:
-            graph.remove_edge(*e)
+        # Removing the node also removes its outgoing edges.
+        for _, successor, data in graph.out_edges(node, data=True):
+            graph.add_edge(chosen_sample, successor, **data)
 
         graph.remove_node(node)
 
@@ -549,9 +466,7 @@ def sample_posterior_predictive(model, node_names):
         )
 
     random_variables = []
-    for node in reversed(list(graph.nodes())):
-        if not isinstance(node, SampleOp):
-            continue
+    for node in reversed(graph.random_variables):
         node.cst_generator = partial(to_sampler, node.cst_generator)
         random_variables.append(node)
 
@@ -564,21 +479,68 @@ def sample_posterior_predictive(model, node_names):
     )
 
 
-def is_dangling(graph, node):
-    if len(graph.out_edges(node)) != 0:
-        return False
-    elif isinstance(node, Op) and node.is_returned:
-        return False
-    elif isinstance(node, Placeholder):
-        return False
-    return True
+def select_returned_values(graph: GraphicalModel) -> GraphicalModel:
+    """Make the successors of SampleModelOps use the value returned by the model.
+
+    The target functions of a submodel return a dictionary of values. We insert
+    an Op that selects the submodel's returned variable,
+    `{rv_name}_value = rv_name['returned_var']`, between each SampleModelOp and
+    its successors.
+
+    """
+    for node in graph.random_variables:
+        if not isinstance(node, SampleModelOp):
+            continue
+
+        rv_name = node.name
+        returned_var_name = node.graph.returned_variables[0].name
+
+        def sample_index(rv, returned_var, *_):
+            return cst.Subscript(
+                cst.Name(rv),
+                [cst.SubscriptElement(cst.SimpleString(f"'{returned_var}'"))],
+            )
+
+        chosen_sample = Op(
+            partial(sample_index, rv_name, returned_var_name),
+            graph.name,
+            f"{rv_name}_value",
+        )
+
+        out_edges = list(graph.out_edges(node, data=True))
+        graph.remove_edges_from(out_edges)
+
+        graph.add(chosen_sample, node)
+        for _, successor, data in out_edges:
+            graph.add_edge(chosen_sample, successor, **data)
+
+    return graph
 
 
 def remove_dangling_nodes(graph) -> GraphicalModel:
-    dangling_nodes = [node for node in graph.nodes() if is_dangling(graph, node)]
+    """Remove the nodes that do not contribute to the function's output.
+
+    A node is dangling when it has no outgoing edge and is neither returned
+    nor a placeholder; removing it may leave its parents dangling in turn.
+    Rather than repeatedly scanning the graph, we walk up the graph once from
+    the returned nodes and placeholders and remove every node not reached.
+
+    """
+    to_visit = [
+        node
+        for node in graph.nodes()
+        if isinstance(node, Placeholder) or (isinstance(node, Op) and node.is_returned)
+    ]
+    reachable = set(to_visit)
+    while to_visit:
+        node = to_visit.pop()
+        for predecessor in graph.predecessors(node):
+            if predecessor not in reachable:
+                reachable.add(predecessor)
+                to_visit.append(predecessor)
+
+    dangling_nodes = [node for node in graph.nodes() if node not in reachable]
     if dangling_nodes:
-        for n in dangling_nodes:
-            graph.remove_node(n)
-        return remove_dangling_nodes(graph)
-    else:
-        return graph
+        graph.remove_nodes_from(dangling_nodes)
+
+    return graph
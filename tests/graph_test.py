@@ -0,0 +1,62 @@
+"""Test that the graphical model's edge tags and node indexes stay in sync
+with its content.
+"""
+import copy
+
+import jax.numpy as jnp
+import pytest
+
+import mcx
+import mcx.distributions as dist
+from mcx.core.nodes import Placeholder, SampleOp
+from mcx.core.target_functions import _logpdf_core
+
+
+# flake8: noqa: F281
+# fmt: off
+def linear_regression(x, lmbda=1.0):
+    sigma <~ dist.Exponential(lmbda)
+    coeffs <~ dist.Normal(jnp.zeros(x.shape[-1]), 1)
+    y = jnp.dot(x, coeffs)
+    predictions <~ dist.Normal(y + 1, sigma)
+    return predictions
+# fmt: on
+
+
+@pytest.fixture(params=["parsed", "deepcopy", "logpdf"])
+def graph(request):
+    """The parsed graph, which goes through `nx.relabel_nodes` for every `<~`
+    statement, a deep copy of it, and a copy rewired by the logpdf
+    transformation.
+    """
+    graph, _ = mcx.core.parse(linear_regression)
+    if request.param == "deepcopy":
+        graph = copy.deepcopy(graph)
+    elif request.param == "logpdf":
+        graph = _logpdf_core(copy.deepcopy(graph))
+    return graph
+
+
+def test_edges_tagged_with_source_anonymity(graph):
+    for source, _, data in graph.edges(data=True):
+        assert data["src_anon"] == (source.name is None)
+
+
+def test_placeholders_index(graph):
+    expected = tuple(node for node in graph.nodes() if isinstance(node, Placeholder))
+    assert graph.placeholders == expected
+
+
+def test_random_variables_index(graph):
+    expected = tuple(node for node in graph.nodes() if isinstance(node, SampleOp))
+    assert graph.random_variables == expected
+
+
+def test_parsed_indexes_order():
+    graph, _ = mcx.core.parse(linear_regression)
+    assert [node.name for node in graph.placeholders] == ["x", "lmbda"]
+    assert [node.name for node in graph.random_variables] == [
+        "sigma",
+        "coeffs",
+        "predictions",
+    ]